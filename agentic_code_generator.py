@@ -1,26 +1,38 @@
 # agentic_code_generator.py
-# pip install openai tk openai-whisper sounddevice numpy scipy
+# pip install openai tk "faster-whisper>=1.1" sounddevice numpy
 import os
+
+# Threading/math tuning for the numpy and CTranslate2 (MKL/oneDNN) backends.
+# These are read when the native libraries initialise, so they must be set before
+# numpy or faster_whisper is imported.
+os.environ.setdefault("OMP_NUM_THREADS", str(os.cpu_count() or 1))
+os.environ.setdefault("MKL_NUM_THREADS", str(os.cpu_count() or 1))
+os.environ.setdefault("DNNL_DEFAULT_FPMATH_MODE", "BF16")
+
+import ast
+import asyncio
+import hashlib
+import queue
+import re
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import traceback
 import tkinter as tk
 from tkinter import simpledialog
-from openai import OpenAI
-import ast
 
 import sounddevice as sd
 import numpy as np
-import whisper
-import scipy.io.wavfile
-import importlib.metadata as md, shutil, sys, os
-import importlib.metadata as _imd
-import re  # stdlib; no pip install required
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel
 
-if tuple(map(int, md.version("openai").split(".")[:2])) < (1, 0):
+import openai
+
+if not hasattr(openai, "AsyncOpenAI"):  # added in openai 1.0
     sys.exit("OpenAI client < 1.0 detected. Run: pip install -U 'openai>=1.3.0'")
-if shutil.which("ffmpeg") is None:
-    sys.exit("FFmpeg not found. Install it or add to PATH before running.")
+from openai import AsyncOpenAI
 
 '''
 # Agentic Code Generator (ACG) - Overview
@@ -45,49 +57,145 @@ Notes:
     - Logs and changelogs can be added easily
 '''
 
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "acg")
+_VERSION_RE = re.compile(r"_v(\d+)$")
+_FENCE_RE = re.compile(r"^\s*```(?:python)?\s*\n(.*?)\n```\s*$", re.DOTALL)
+
 class ACG:
-    def __init__(self, api_key=None, model="gpt-4", whisper_model="base"):
+    # Whisper models shared by every ACG instance, keyed by (model name, device, compute type).
+    _model_cache = {}
+    _model_lock = threading.Lock()
+
+    def __init__(self, api_key=None, model="gpt-4", whisper_model="tiny.en", cache_dir=CACHE_DIR,
+                 compute_type=None):
         """
         Initialize the Agentic Code Generator.
 
         :param api_key: Optional OpenAI API key. Uses OPENAI_API_KEY env var if None.
         :param model: GPT model name.
-        :param whisper_model: Whisper model name ("tiny", "base", "small", etc.).
+        :param whisper_model: Whisper model name ("tiny.en", "base.en", "distil-small.en",
+            "distil-medium.en", etc.). Use a multilingual name such as "base" for non-English speech.
+        :param cache_dir: Directory for cached GPT responses. Pass None to disable caching.
+        :param compute_type: CTranslate2 compute type for Whisper ("int8", "float16", "bfloat16", ...).
+            Defaults to "float16" on CUDA and "int8" on CPU.
         """
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        self.aclient = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
         self.model = model
-        self.whisper = whisper.load_model(whisper_model)
+        self.cache_dir = cache_dir
+        self._whisper_name = whisper_model
+        self._compute_type = compute_type
+        self._whisper = None
+        self._loop = None
+        self._reserved_paths = set()
 
-    def request_change(self, caller_script: str, use_voice=False, record_time=10):
+    @property
+    def whisper_model(self):
+        """
+        Whisper model, loaded on first use so typed requests never pay for it.
+        Instances asking for the same model, device and compute type share one copy.
+        """
+        if self._whisper is None:
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+            compute_type = self._compute_type or ("float16" if device == "cuda" else "int8")
+            key = (self._whisper_name, device, compute_type)
+            with ACG._model_lock:
+                model = ACG._model_cache.get(key)
+                if model is None:
+                    model = self._load_whisper(device, compute_type)
+                    ACG._model_cache[key] = model
+            self._whisper = model
+        return self._whisper
+
+    def _load_whisper(self, device: str, compute_type: str):
+        """
+        Load the Whisper model, using flash attention on CUDA when the GPU supports it.
+        """
+        if device == "cuda":
+            try:
+                # Fused attention avoids materialising the full attention matrix (Ampere or newer).
+                return WhisperModel(self._whisper_name, device=device, compute_type=compute_type,
+                                    flash_attention=True)
+            except Exception as e:
+                print(f"Flash attention unavailable, using standard attention: {e}")
+        return WhisperModel(self._whisper_name, device=device, compute_type=compute_type)
+
+    def request_change(self, caller_script: str, use_voice=False, record_time=10, wait=True, parent=None):
         """
         Request a code change from GPT-4 based on user input.
 
         :param caller_script: The current script file path.
         :param use_voice: Whether to use Whisper voice input.
         :param record_time: Duration (in seconds) for the Whisper voice recording. Default is 10 seconds.
+        :param wait: Block until the new version is launched. Pass False from a GUI callback
+            to keep the mainloop responsive while the OpenAI request runs in the background.
+        :param parent: Optional Tk widget to own the request dialog. Defaults to the app's existing root.
+        :return: concurrent.futures.Future for the background request, or None if nothing was requested.
         """
         request_text = (
-            self._record_and_transcribe(record_time=record_time) if use_voice else self._get_user_request()
+            self._record_and_transcribe(record_time=record_time) if use_voice else self._get_user_request(parent)
         )
         if not request_text:
             return
 
+        future = self._run_async(self.request_change_async(caller_script, request_text))
+        if wait:
+            future.result()
+        else:
+            future.add_done_callback(self._report_failure)
+        return future
+
+    @staticmethod
+    def _report_failure(future):
+        """
+        Print the traceback of a background request that raised, since nobody waits on its future.
+        """
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            print("ACG request failed:")
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+    def _run_async(self, coro):
+        """
+        Schedule a coroutine on the ACG event loop, starting its thread on first use.
+        A single long-lived loop lets the AsyncOpenAI client reuse its connections
+        and lets several requests interleave.
+
+        :return: concurrent.futures.Future for the coroutine's result.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def request_change_async(self, caller_script: str, request_text: str):
+        """
+        Generate, save and launch a new version of caller_script for an already captured request.
+
+        :param caller_script: The current script file path.
+        :param request_text: The user's change request.
+        """
         original_code = self._read_code(caller_script)
-        modified_code = self._generate_modified_code(original_code, request_text)
-        if not modified_code:
+        new_script_path = await self._save_new_version(caller_script, original_code, request_text)
+        if not new_script_path:
             return
 
-        new_script_path = self._save_new_version(caller_script, modified_code)
         self._launch_new_script(new_script_path)
 
-    def _get_user_request(self) -> str:
+    def _get_user_request(self, parent=None) -> str:
         """
         Prompt user for a change request via a popup text box.
+        Reuses the caller's Tk root when there is one; a hidden root is created only for CLI use.
         """
-        root = tk.Tk()
-        root.withdraw()
-        request = simpledialog.askstring("ACG Request", "Describe the code change:")
-        root.destroy()
+        root = parent or tk._default_root
+        owns_root = root is None
+        if owns_root:
+            root = tk.Tk()
+            root.withdraw()
+        request = simpledialog.askstring("ACG Request", "Describe the code change:", parent=root)
+        if owns_root:
+            root.destroy()
         return request.strip() if request else ""
 
     def _record_and_transcribe(self, record_time=10, samplerate=16000) -> str:
@@ -98,18 +206,49 @@ class ACG:
         :param samplerate: Audio sample rate.
         :return: Transcribed string.
         """
+        # Load the model while the microphone is busy instead of after it.
+        loader = threading.Thread(target=lambda: self.whisper_model, daemon=True)
+        loader.start()
+
+        blocks = queue.Queue()
+
+        def callback(indata, frames, time_info, status):
+            blocks.put(indata.copy())
+
         print(f"🎙️ Recording {record_time} seconds...")
-        audio = sd.rec(int(record_time * samplerate), samplerate=samplerate, channels=1, dtype="float32")
-        sd.wait()
+        with sd.InputStream(samplerate=samplerate, channels=1, dtype="int16", callback=callback):
+            sd.sleep(int(record_time * 1000))
 
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            path = tmp.name
-            scipy.io.wavfile.write(path, samplerate, (audio * 32767).astype(np.int16))
+        chunks = []
+        while not blocks.empty():
+            chunks.append(blocks.get_nowait())
+        if not chunks:
+            return ""
+        audio = np.concatenate(chunks)
 
         print("🧠 Transcribing with Whisper...")
-        result = self.whisper.transcribe(path)
-        print(f"📝 Transcribed: {result['text']}")
-        return result["text"]
+        loader.join()
+        audio_np = audio.squeeze().astype(np.float32) / 32768.0
+        # vad_filter trims silence with faster-whisper's bundled Silero VAD so the
+        # encoder only runs on the spoken part of the recording.
+        if len(audio_np) > 30 * samplerate:
+            # Past one 30 s Whisper window, split at VAD boundaries and decode the chunks as a batch.
+            batched = BatchedInferencePipeline(model=self.whisper_model)
+            segments, _ = batched.transcribe(audio_np, beam_size=1, vad_filter=True, batch_size=8)
+        else:
+            segments, _ = self.whisper_model.transcribe(audio_np, beam_size=1, vad_filter=True)
+        text = "".join(s.text for s in segments).strip()
+        if not text:
+            # A quiet command can fall under the default VAD threshold. Retry with a looser one, but
+            # drop segments Whisper itself scores as silence so it cannot invent a request.
+            segments, _ = self.whisper_model.transcribe(audio_np, beam_size=1, vad_filter=True,
+                                                        vad_parameters={"threshold": 0.2})
+            text = "".join(s.text for s in segments if s.no_speech_prob < 0.6).strip()
+        if not text:
+            print("🔇 No speech detected.")
+            return ""
+        print(f"📝 Transcribed: {text}")
+        return text
 
     def _read_code(self, filepath: str) -> str:
         """
@@ -118,22 +257,24 @@ class ACG:
         :param filepath: Path to the script file.
         :raises SyntaxError: If the code is not valid Python.
         """
-        with open(filepath, "r", encoding="utf-8") as f:
-            code = f.read()
+        with open(filepath, "rb") as f:
+            data = f.read()
         try:
-            ast.parse(code, filename=filepath)
+            ast.parse(data, filename=filepath)
         except SyntaxError as e:
             print(f"Syntax error in {filepath}: {e}")
             raise
-        return code
+        return data.decode("utf-8")
 
-    def _generate_modified_code(self, original_code: str, request: str) -> str:
+    async def _generate_modified_code(self, original_code: str, request: str, out=None) -> str:
         """
-        Call OpenAI to modify the code according to the request.
+        Call OpenAI to modify the code according to the request, streaming the reply.
 
         :param original_code: The source Python code.
         :param request: User's natural language request.
-        :return: New modified code.
+        :param out: Optional text file; each streamed token is written to it as it arrives.
+            On return it holds exactly the returned code.
+        :return: New modified code, or None if the request failed or never produced valid Python.
         """
         prompt = f"""You are an expert Python developer. A user provided the following code and wants it changed.
 
@@ -146,17 +287,130 @@ class ACG:
 --- INSTRUCTIONS ---
 Rewrite the full Python script to reflect the request. Return code only — no comments or markdown. Keep the Type Request and Speech Input buttons if possible.
 """
+        key = self._cache_key(original_code, request)
+        cached = self._cache_get(key)
+        if cached is not None:
+            print("⚡ Reusing cached response for this request")
+            if out is not None:
+                out.write(cached)
+            return cached
+
+        messages = [{"role": "user", "content": prompt}]
+        for attempt in range(2):
+            if out is not None:
+                out.seek(0)
+                out.truncate()
+            text = await self._stream_completion(messages, out)
+            if text is None:
+                return None
+
+            # The model sometimes wraps the script in ```python fences despite the instructions.
+            match = _FENCE_RE.match(text)
+            modified_code = match.group(1) if match else text
+            try:
+                ast.parse(modified_code)
+            except SyntaxError as e:
+                print(f"Generated code does not parse: {e}")
+                messages += [
+                    {"role": "assistant", "content": text},
+                    {"role": "user", "content": f"Your previous output didn't parse: {e}. "
+                                                "Return the full corrected script only."},
+                ]
+                continue
+
+            if match and out is not None:
+                out.seek(0)
+                out.truncate()
+                out.write(modified_code)
+            self._cache_put(key, modified_code)
+            return modified_code
+        return None
+
+    async def _stream_completion(self, messages: list, out=None) -> str:
+        """
+        Stream a chat completion, writing each token to out as it arrives.
+
+        :param messages: Chat messages to send.
+        :param out: Optional text file for the streamed tokens.
+        :return: The full reply, or None if the request failed.
+        """
         try:
-            response = self.client.chat.completions.create(
+            stream = await self.aclient.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
+                messages=messages,
+                temperature=0.3,
+                stream=True
             )
-            return response.choices[0].message.content
+            parts = []
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                if out is not None:
+                    out.write(delta)
+                    if "\n" in delta:
+                        out.flush()
+            return "".join(parts)
         except Exception as e:
             print(f"OpenAI request failed: {e}")
             return None
 
+    def _cache_key(self, original_code: str, request: str) -> str:
+        """
+        SHA-256 of (model, request, original code), used as the cached response's file name.
+        """
+        return hashlib.sha256(f"{self.model}\0{request}\0{original_code}".encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str):
+        """
+        Return the cached response for key, or None on a miss or when caching is disabled.
+        An entry that is not valid Python (e.g. a truncated write) is deleted and treated as a miss.
+        """
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, key + ".py")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                code = f.read()
+            ast.parse(code)
+        except OSError:
+            return None
+        except (SyntaxError, ValueError):  # ValueError covers UnicodeDecodeError and null bytes
+            print(f"Discarding corrupt cache entry: {path}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return code
+
+    def _cache_put(self, key: str, modified_code: str):
+        """
+        Store a response under key. Failures are reported but never abort the request.
+        """
+        if not self.cache_dir or not modified_code:
+            return
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Same temp-then-rename step as _save_new_version, so a cut-off write never
+            # leaves a truncated entry behind.
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(modified_code)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.cache_dir, key + ".py"))
+        except OSError as e:
+            print(f"Could not write response cache: {e}")
+        finally:
+            if tmp and os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
     @staticmethod                    # ⬅️  add this line
     def next_version(fname: str) -> str:
         """
@@ -165,27 +419,50 @@ Rewrite the full Python script to reflect the request. Return code only — no c
             hello_world.py     -> hello_world_v1.py
             hello_world_v2.py  -> hello_world_v3.py
             hello_world_v99.py -> hello_world_v100.py
+            foo.bar_v2.py      -> foo.bar_v3.py
         """
-        base, dot, ext = fname.partition(".")
-        match = re.search(r"_v(\d+)$", base)
+        base, ext = os.path.splitext(fname)
+        match = _VERSION_RE.search(base)
         if match:
             num = int(match.group(1)) + 1
             new_base = f"{base[:match.start(1)]}{num}"
         else:
             new_base = f"{base}_v1"
-        return f"{new_base}{dot}{ext}"
+        return f"{new_base}{ext}"
     
-    def _save_new_version(self, base_path: str, modified_code: str) -> str:
+    async def _save_new_version(self, base_path: str, original_code: str, request: str) -> str:
         """
-        Save a modified version of the script to a new versioned filename.
+        Stream a modified version of the script from GPT into a new versioned filename.
 
         :param base_path: Original script path.
-        :param modified_code: The updated code from GPT.
-        :return: Path to the new versioned file.
+        :param original_code: The source Python code.
+        :param request: User's natural language request.
+        :return: Path to the new versioned file (the first unused _v<number> name),
+            or None if generation failed.
         """
+        # Skip names already on disk or claimed by another in-flight request. All requests
+        # run on the single ACG event loop, so the reservation set needs no lock.
         candidate = self.next_version(base_path)
-        with open(candidate, "w", encoding="utf-8") as f:
-            f.write(modified_code)
+        while os.path.exists(candidate) or candidate in self._reserved_paths:
+            candidate = self.next_version(candidate)
+        # Stream into a uniquely named temp file and rename once complete, so the new
+        # version never exists in a half-written state and concurrent requests never share it.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(candidate) or ".", suffix=".tmp")
+        self._reserved_paths.add(candidate)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                modified_code = await self._generate_modified_code(original_code, request, out=f)
+                f.flush()
+                os.fsync(f.fileno())
+            if not modified_code:
+                return None
+            # mkstemp creates the file as 0600; give the new version the original script's mode.
+            shutil.copymode(base_path, tmp)
+            os.replace(tmp, candidate)
+        finally:
+            self._reserved_paths.discard(candidate)
+            if os.path.exists(tmp):
+                os.remove(tmp)
         print(f"✅ Saved new version: {candidate}")
         return candidate
 
@@ -198,7 +475,6 @@ Rewrite the full Python script to reflect the request. Return code only — no c
             "stdout": subprocess.DEVNULL,
             "stderr": subprocess.DEVNULL,
             "stdin": subprocess.DEVNULL,
-            "close_fds": True
         }
 
         if sys.platform == "win32":
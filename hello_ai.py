@@ -1,16 +1,16 @@
 # hello_ai.py
-# pip install tk openai-whisper sounddevice numpy
+# pip install tk "faster-whisper>=1.1" sounddevice numpy
 
 import tkinter as tk
 from agentic_code_generator import ACG
 
 acg = ACG()
 
-def type_input():
-    acg.request_change(__file__, use_voice=False)
+def type_input(parent=None):
+    acg.request_change(__file__, use_voice=False, wait=False, parent=parent)
 
 def speech_input():
-    acg.request_change(__file__, use_voice=True)
+    acg.request_change(__file__, use_voice=True, wait=False)
 
 def main():
     root = tk.Tk()
@@ -22,7 +22,7 @@ def main():
     tk.Button(
         root,
         text="📝 Type Request",
-        command=type_input
+        command=lambda: type_input(root)
     ).pack(pady=5)
 
     # Speech input button
@@ -1,5 +1,5 @@
 # hello_world.py
-# pip install tk openai-whisper sounddevice numpy openai
+# pip install tk "faster-whisper>=1.1" sounddevice numpy openai
 
 import tkinter as tk
 from agentic_code_generator import ACG